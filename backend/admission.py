@@ -0,0 +1,145 @@
+"""
+Admission control for the LLM-bound /generate_quiz path.
+
+Only MAX_CONCURRENT generations run at once and at most MAX_QUEUE wait
+behind them. A request is shed with 503 + Retry-After when the queue is full
+or its estimated wait (EWMA of recent generation times) exceeds the deadline.
+Cache hits and read-only routes never pass through here, so they stay fast
+when Gemini slows down.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, Request, status
+
+MAX_CONCURRENT = int(os.getenv("GEN_MAX_CONCURRENT", "4"))
+MAX_QUEUE = int(os.getenv("GEN_MAX_QUEUE", "16"))
+DEADLINE_SECONDS = float(os.getenv("GEN_DEADLINE_SECONDS", "60"))
+# Starting guess for one scrape + LLM round trip, refined as requests finish
+INITIAL_SERVICE_SECONDS = float(os.getenv("GEN_INITIAL_SERVICE_SECONDS", "20"))
+
+# How often an in-flight generation checks whether the client is still there
+DISCONNECT_POLL_SECONDS = 1.0
+
+
+class ClientDisconnected(Exception):
+    """Raised in the route when the client disconnects mid-generation."""
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT,
+        max_queue: int = MAX_QUEUE,
+        deadline_seconds: float = DEADLINE_SECONDS,
+        initial_service_seconds: float = INITIAL_SERVICE_SECONDS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self.avg_service_seconds = initial_service_seconds
+        self.in_flight = 0
+        self.queued = 0
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    def estimated_wait(self) -> float:
+        """Seconds a new arrival would wait for a free slot."""
+        if self.in_flight < self.max_concurrent:
+            return 0.0
+        return (self.queued + 1) / self.max_concurrent * self.avg_service_seconds
+
+    def _reject(self, wait: float):
+        retry_after = max(1, math.ceil(wait))
+        print(
+            f"--- [ADMISSION] Shedding request (in flight: {self.in_flight}, "
+            f"queued: {self.queued}, est. wait: {wait:.1f}s) ---"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Quiz generation is busy right now. Try again in {retry_after} seconds.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def _acquire(self, request: Request = None):
+        """
+        Waits for the semaphore until the deadline, polling the client while
+        queued. Raises ClientDisconnected if it leaves, giving up its place.
+        """
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_seconds
+        try:
+            while True:
+                timeout = min(DISCONNECT_POLL_SECONDS, deadline - loop.time())
+                done, _ = await asyncio.wait({acquire}, timeout=max(timeout, 0))
+                if done:
+                    return
+                if request is not None and await request.is_disconnected():
+                    print("--- [ADMISSION] Client left while queued ---")
+                    raise ClientDisconnected()
+                if loop.time() >= deadline:
+                    raise asyncio.TimeoutError()
+        except BaseException:
+            # A slot granted in the meantime must not leak
+            if not acquire.cancel() and not acquire.cancelled():
+                if acquire.exception() is None:
+                    self._slots.release()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, request: Request = None):
+        """
+        Waits for a generation slot, or raises 503 if that would take too long.
+        With a request, a client that disconnects while queued raises
+        ClientDisconnected instead of holding its place in the queue.
+        """
+        wait = self.estimated_wait()
+        if self.queued >= self.max_queue or wait > self.deadline_seconds:
+            self._reject(wait)
+
+        self.queued += 1
+        try:
+            await self._acquire(request)
+        except asyncio.TimeoutError:
+            self._reject(self.estimated_wait())
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+            # Only completed generations feed the service-time estimate
+            elapsed = time.monotonic() - start
+            self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * elapsed
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+
+async def run_until_disconnect(
+    request: Request, work, cancel_event: threading.Event
+):
+    """
+    Awaits `work` while polling the client connection. On disconnect the
+    worker is told to stop at its next checkpoint, and we wait for it so the
+    slot stays accounted for. Raises ClientDisconnected unless the work
+    finished anyway, in which case the result is still returned for caching.
+    """
+    task = asyncio.ensure_future(work)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            print("--- [ADMISSION] Client disconnected, cancelling generation ---")
+            cancel_event.set()
+            await asyncio.wait({task})
+            if task.exception() is not None:
+                raise ClientDisconnected() from task.exception()
+            return task.result()
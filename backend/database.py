@@ -1,22 +1,152 @@
 import json
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from datetime import datetime
 
 # Read the DATABASE_URL from the environment
 # Use SQLite as a fallback for local development
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./quiz_history.db")
 
-# Remove SQLite-only argument if using Postgres
-connect_args = {}
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+# --- CONNECTION POOL SETTINGS ---
+# Each process opens exactly two pools: the sync engine (threadpool routes,
+# RAG helpers and PGVector, which is handed this engine) and the async engine
+# (non-blocking request paths). The per-process connection budget is split
+# explicitly between them; worst case per worker is
+#   DB_SYNC_POOL_SIZE + DB_SYNC_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW
+# (10 with the defaults), which has to fit the Postgres/pooler limit.
+SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "3"))
+SYNC_MAX_OVERFLOW = int(os.getenv("DB_SYNC_MAX_OVERFLOW", "2"))
+ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "3"))
+ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "2"))
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+# Settings common to both pools
+POOL_SETTINGS = {
+    "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    # Drop connections before the server/pooler closes them (Supabase ~ 5 min)
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "280")),
+    # Test connections on checkout so a stale one never reaches a request
+    "pool_pre_ping": True,
+}
+
+# Transaction-mode poolers (PgBouncer; Supabase's pooler on port 6543) hand
+# each transaction to a different server connection, which breaks asyncpg's
+# prepared-statement cache ("prepared statement __asyncpg_stmt_N__ already
+# exists"). "auto" detects the Supabase pooler; set 1/0 to force it on/off.
+ASYNC_PGBOUNCER = os.getenv("DB_ASYNC_PGBOUNCER", "auto").lower()
+TRANSACTION_POOLER_PORT = 6543
+
+# WAL lets readers keep going while a single writer commits, instead of the
+# whole file being locked by the default rollback journal.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def uses_transaction_pooler(parsed_url) -> bool:
+    if ASYNC_PGBOUNCER in ("1", "true", "yes", "on"):
+        return True
+    if ASYNC_PGBOUNCER in ("0", "false", "no", "off"):
+        return False
+    return parsed_url.port == TRANSACTION_POOLER_PORT or "pooler." in (
+        parsed_url.host or ""
+    )
+
+
+def to_async_url(url: str) -> tuple:
+    """
+    Swaps the sync driver in a database URL for its asyncio counterpart.
+    Returns (async_url, connect_args): libpq-only query parameters that asyncpg
+    rejects (sslmode, connect_timeout, application_name) are moved into asyncpg connect arguments.
+    Behind a transaction-mode pooler, asyncpg's and SQLAlchemy's statement caches are disabled.
+    """
+    parsed = make_url(url)
+    connect_args = {}
+    backend = parsed.drivername.split("+")[0]
+
+    if backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    elif backend in ("postgres", "postgresql"):
+        # Covers postgres://, postgresql:// and postgresql+psycopg2://
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+        query = dict(parsed.query)
+        if "sslmode" in query:
+            # asyncpg's ssl argument accepts the libpq mode names (require, verify-full, ...)
+            connect_args["ssl"] = query.pop("sslmode")
+        if "connect_timeout" in query:
+            connect_args["timeout"] = float(query.pop("connect_timeout"))
+        if "application_name" in query:
+            connect_args["server_settings"] = {
+                "application_name": query.pop("application_name")
+            }
+        if uses_transaction_pooler(parsed):
+            connect_args["statement_cache_size"] = 0
+            query["prepared_statement_cache_size"] = "0"
+        parsed = parsed.set(query=query)
+
+    return parsed.render_as_string(hide_password=False), connect_args
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _engine_kwargs(url: str, poolclass, pool_size: int, max_overflow: int) -> dict:
+    kwargs = dict(POOL_SETTINGS, pool_size=pool_size, max_overflow=max_overflow)
+    if is_sqlite(url):
+        # In-memory databases live inside a single connection; keep SQLAlchemy's default pool
+        if ":memory:" in url or url.rstrip("/").endswith(":"):
+            return {"connect_args": {"check_same_thread": False}}
+        kwargs["poolclass"] = poolclass
+        kwargs["connect_args"] = {"check_same_thread": False}
+    return kwargs
+
+
+def build_engine(url: str):
+    """Sync engine used by the threadpool routes, the RAG helpers and PGVector."""
+    db_engine = create_engine(
+        url, **_engine_kwargs(url, QueuePool, SYNC_POOL_SIZE, SYNC_MAX_OVERFLOW)
+    )
+    if is_sqlite(url):
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+
+def build_async_engine(url: str):
+    """Async engine (asyncpg / aiosqlite) for the non-blocking request paths."""
+    async_url, connect_args = to_async_url(url)
+    kwargs = _engine_kwargs(
+        async_url, AsyncAdaptedQueuePool, ASYNC_POOL_SIZE, ASYNC_MAX_OVERFLOW
+    )
+    kwargs["connect_args"] = {**kwargs.get("connect_args", {}), **connect_args}
+    db_engine = create_async_engine(async_url, **kwargs)
+    if is_sqlite(async_url):
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
+async_engine = build_async_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
 
@@ -46,3 +176,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Async dependency for FastAPI (read-only routes)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,5 +1,6 @@
 import os
 import random
+import threading
 import time
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -11,10 +12,17 @@ from models import QuizOutput
 load_dotenv()
 
 
-def generate_quiz_data(article_text: str) -> dict:
+class GenerationCancelled(Exception):
+    """Raised inside the worker thread once the client has gone away."""
+
+
+def generate_quiz_data(
+    article_text: str, cancel_event: threading.Event = None
+) -> dict:
     """
     Generates quiz data from article text using Gemini and LangChain.
     Returns a dictionary matching the QuizOutput Pydantic schema.
+    If cancel_event is set (client disconnected), stops before the next attempt.
     """
 
     # 1. Initialize the Pydantic parser
@@ -65,6 +73,8 @@ def generate_quiz_data(article_text: str) -> dict:
     # 5. Invoke the Chain with a Manual Retry Loop
     max_attempts = 3
     for attempt in range(max_attempts):
+        if cancel_event and cancel_event.is_set():
+            raise GenerationCancelled("Client disconnected before generation finished")
         try:
             # We don't inject random_number into the prompt text to save tokens,
             # but we can pass it if we want to ensure variety in the call signature.
@@ -83,7 +93,11 @@ def generate_quiz_data(article_text: str) -> dict:
                 print(
                     f"--- [LLM] Rate Limit Hit. Retrying in {wait_time}s... (Attempt {attempt+1}/{max_attempts}) ---"
                 )
-                time.sleep(wait_time)
+                if cancel_event:
+                    # Wakes up early if the client goes away mid-backoff
+                    cancel_event.wait(wait_time)
+                else:
+                    time.sleep(wait_time)
             else:
                 print(f"--- [LLM] Error during generation: {e} ---")
                 raise
@@ -1,17 +1,23 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, status, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from pydantic import BaseModel
+import threading
 
 # Internal imports
 import database, scraper, llm_quiz_generator
-from database import engine, get_db, QuizHistory
+from database import engine, get_db, get_async_db, QuizHistory
 from models import GenerateQuizRequest, HistoryItem, UserUsage
+from admission import AdmissionController, ClientDisconnected, run_until_disconnect
 
 # --- NEW RAG IMPORTS ---
 # (Ensure you created rag_pipeline.py in the same folder)
 from rag_pipeline import add_to_knowledge_base, get_hybrid_recommendations
+from topic_graph import get_prerequisites, update_topic_neighbourhood
 
 # Create DB tables
 database.Base.metadata.create_all(bind=engine)
@@ -74,6 +80,43 @@ def check_rate_limit(request: Request, db: Session = Depends(get_db)):
     db.commit()
 
 
+async def refund_rate_limit(db: AsyncSession, client_ip: str):
+    """
+    Gives back the quota taken by check_rate_limit when no quiz was generated
+    because the request was shed (503) or the client left (499).
+    """
+    await db.execute(
+        update(UserUsage)
+        .where(UserUsage.ip_address == client_ip, UserUsage.count > 0)
+        .values(count=UserUsage.count - 1)
+    )
+    await db.commit()
+
+
+# --- ADMISSION CONTROL (LLM-bound generation only) ---
+generation_admission = AdmissionController()
+
+
+def scrape_and_generate(url: str, cancel_event: threading.Event) -> dict:
+    """
+    The slow part of /generate_quiz, run in the threadpool.
+    Checks cancel_event between stages so abandoned requests stop early.
+    """
+    # Scrape Wikipedia
+    title, article_text = scraper.scrape_wikipedia(url)
+    if not article_text:
+        raise HTTPException(status_code=400, detail="Could not scrape content.")
+
+    # The client may have left while we were scraping
+    if cancel_event.is_set():
+        raise llm_quiz_generator.GenerationCancelled("Client disconnected during scraping")
+
+    # Generate quiz using AI
+    return llm_quiz_generator.generate_quiz_data(
+        article_text, cancel_event=cancel_event
+    )
+
+
 # --- SCHEMAS FOR NEW ENDPOINTS ---
 class RecommendRequest(BaseModel):
     failed_topic: str
@@ -89,18 +132,21 @@ def read_root():
 
 
 @app.post("/generate_quiz", dependencies=[Depends(check_rate_limit)])
-def generate_quiz(
+async def generate_quiz(
     request: GenerateQuizRequest,
+    http_request: Request,
     background_tasks: BackgroundTasks,  # <-- ADDED BACKGROUND TASKS
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
         print(f"--- Processing URL: {request.url} ---")
 
         # --- 1. CACHE CHECK (The Money Saver) ---
-        existing_quiz = (
-            db.query(QuizHistory).filter(QuizHistory.url == request.url).first()
+        # Runs before admission control so cache hits stay fast under overload
+        result = await db.execute(
+            select(QuizHistory).filter(QuizHistory.url == request.url).limit(1)
         )
+        existing_quiz = result.scalars().first()
 
         if existing_quiz:
             print(
@@ -111,16 +157,18 @@ def generate_quiz(
             cached_data["created_at"] = existing_quiz.date_generated.isoformat()
             return cached_data
 
-        # --- 2. CACHE MISS → Generate fresh quiz ---
-        print("--- [CACHE MISS] URL not found. Starting fresh generation. ---")
-
-        # Scrape Wikipedia
-        title, article_text = scraper.scrape_wikipedia(request.url)
-        if not article_text:
-            raise HTTPException(status_code=400, detail="Could not scrape content.")
+        # Give the connection back to the pool while we wait on Gemini
+        await db.rollback()
 
-        # Generate quiz using AI
-        quiz_data = llm_quiz_generator.generate_quiz_data(article_text)
+        # --- 2. CACHE MISS → Generate fresh quiz (bounded by admission control) ---
+        print("--- [CACHE MISS] URL not found. Starting fresh generation. ---")
+        cancel_event = threading.Event()
+        async with generation_admission.slot(http_request):
+            quiz_data = await run_until_disconnect(
+                http_request,
+                run_in_threadpool(scrape_and_generate, request.url, cancel_event),
+                cancel_event,
+            )
         quiz_data["url"] = request.url
 
         # Save to Database
@@ -131,8 +179,8 @@ def generate_quiz(
         db_record.set_full_data(quiz_data)
 
         db.add(db_record)
-        db.commit()
-        db.refresh(db_record)  # Generates the ID
+        await db.commit()
+        await db.refresh(db_record)  # Generates the ID
 
         # --- NEW: BACKGROUND RAG INGESTION ---
         # We add the new quiz summary to our Vector DB in the background
@@ -143,6 +191,13 @@ def generate_quiz(
                 title=db_record.title,
                 summary=quiz_data["summary"],
             )
+            # Only the new topic's neighbourhood in the prerequisite graph is touched
+            background_tasks.add_task(
+                update_topic_neighbourhood,
+                title=db_record.title,
+                summary=quiz_data["summary"],
+                related_topics=quiz_data.get("related_topics", []),
+            )
 
         # Inject ID + created_at into response
         response_payload = quiz_data.copy()
@@ -151,26 +206,38 @@ def generate_quiz(
 
         return response_payload
 
+    except ClientDisconnected:
+        # Nobody is listening; 499 = client closed request
+        await refund_rate_limit(db, http_request.client.host)
+        return Response(status_code=499)
+    except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            # Shed by admission control: doesn't count against the hourly quota
+            await refund_rate_limit(db, http_request.client.host)
+        raise
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/history", response_model=list[HistoryItem])
-def get_quiz_history(db: Session = Depends(get_db)):
+async def get_quiz_history(db: AsyncSession = Depends(get_async_db)):
     """
     Returns a list of all previously generated quizzes.
+    Runs on the async engine so reads don't compete for threadpool slots.
     """
-    history = db.query(QuizHistory).order_by(QuizHistory.date_generated.desc()).all()
-    return history
+    result = await db.execute(
+        select(QuizHistory).order_by(QuizHistory.date_generated.desc())
+    )
+    return result.scalars().all()
 
 
 @app.get("/quiz/{quiz_id}")
-def get_quiz_details(quiz_id: int, db: Session = Depends(get_db)):
+async def get_quiz_details(quiz_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Fetches the full JSON data for a single quiz by its ID.
     """
-    db_record = db.query(QuizHistory).filter(QuizHistory.id == quiz_id).first()
+    db_record = await db.get(QuizHistory, quiz_id)
 
     if not db_record:
         raise HTTPException(status_code=404, detail="Quiz not found")
@@ -180,14 +247,20 @@ def get_quiz_details(quiz_id: int, db: Session = Depends(get_db)):
 
 # --- NEW ENDPOINT: ADAPTIVE LEARNING PATH (RAG) ---
 @app.post("/recommend_path")
-def recommend_path(request: RecommendRequest):
+def recommend_path(request: RecommendRequest, db: Session = Depends(get_db)):
     """
-    Takes a failed topic and uses Hybrid RAG to suggest the next topics to study.
+    Takes a failed topic and suggests the next topics to study.
+    Known topics are a direct lookup in the precomputed prerequisite graph;
+    anything else falls back to the live Hybrid RAG pipeline.
     """
     try:
-        recommendations = get_hybrid_recommendations(
-            request.failed_topic, request.summary_of_failed_topic
-        )
+        recommendations = get_prerequisites(db, request.failed_topic)
+        if recommendations:
+            print(f"--- [GRAPH HIT] Prerequisites for '{request.failed_topic}' ---")
+        else:
+            recommendations = get_hybrid_recommendations(
+                request.failed_topic, request.summary_of_failed_topic
+            )
         return {
             "message": "Based on your performance, we recommend studying these fundamentals first:",
             "recommended_topics": recommendations,
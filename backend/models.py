@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Dict
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, LargeBinary, DDL, event
 from database import Base
 
 # --- Pydantic Schemas for LLM Output ---
@@ -57,3 +57,77 @@ class UserUsage(Base):
     ip_address = Column(String, primary_key=True, index=True)
     count = Column(Integer, default=0)
     window_start = Column(DateTime, default=datetime.utcnow)
+
+
+class KnowledgeArticle(Base):
+    """Lead-section summaries bulk-loaded from a Wikipedia dump (see wiki_dump_ingest.py)."""
+
+    __tablename__ = "knowledge_articles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, unique=True, index=True)
+    summary = Column(Text)
+    source = Column(String)
+
+
+# Inverted index for keyword search over the bootstrap corpus, kept inside
+# Postgres so the API never loads the corpus itself. Postgres only: the dump
+# is loaded next to PGVector, which needs Postgres anyway.
+KNOWLEDGE_ARTICLE_SEARCH_DDL = [
+    "ALTER TABLE knowledge_articles ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', "
+    "coalesce(title, '') || ' ' || coalesce(summary, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_knowledge_articles_search "
+    "ON knowledge_articles USING GIN (search_vector)",
+]
+
+for statement in KNOWLEDGE_ARTICLE_SEARCH_DDL:
+    event.listen(
+        KnowledgeArticle.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
+
+
+class TopicNode(Base):
+    """One quizzed topic in the prerequisite graph (see topic_graph.py)."""
+
+    __tablename__ = "topic_nodes"
+
+    title = Column(String, primary_key=True, index=True)
+    # float32 summary embedding, kept so new quizzes only re-score their own neighbourhood
+    embedding = Column(LargeBinary)
+    # Summary length in tokens (BM25 length normalisation)
+    length = Column(Integer)
+
+
+class TopicTerm(Base):
+    """Inverted index of topic summaries: BM25 statistics kept incrementally."""
+
+    __tablename__ = "topic_terms"
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String, index=True)
+    term = Column(String, index=True)
+    tf = Column(Integer)
+
+
+class TopicLink(Base):
+    """A topic's `related_topics` entries (lower-cased), for link evidence."""
+
+    __tablename__ = "topic_links"
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String, index=True)
+    target = Column(String, index=True)
+
+
+class TopicEdge(Base):
+    """Directed k-nearest-neighbour edge: topic -> neighbor, strongest first."""
+
+    __tablename__ = "topic_edges"
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String, index=True)
+    neighbor = Column(String)
+    weight = Column(Float)
@@ -2,17 +2,36 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores.pgvector import PGVector
 from rank_bm25 import BM25Okapi
 from flashrank import Ranker, RerankRequest
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from database import SessionLocal, QuizHistory
+from database import SessionLocal, QuizHistory, engine
+from functools import lru_cache
 import os
 
 # 1. Initialize PyTorch-backed Embeddings (Local, Free, Fast)
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
 
 # Database connection
 CONNECTION_STRING = os.getenv("DATABASE_URL")
 
 
+@lru_cache(maxsize=1)
+def get_vector_store():
+    """
+    Single PGVector instance for the process. It is handed the app's sync
+    engine, so vector queries share that connection pool instead of opening
+    a third one.
+    """
+    return PGVector(
+        connection_string=CONNECTION_STRING,
+        embedding_function=embeddings,
+        collection_name="knowledge_base",
+        # PGVector only wraps this in Session(...), so an Engine works as well
+        connection=engine,
+    )
+
+
 def get_all_topics_from_db():
     """Helper function to get all historical summaries for Keyword Search."""
     db: Session = SessionLocal()
@@ -39,6 +58,34 @@ def get_all_topics_from_db():
         db.close()
 
 
+def search_knowledge_articles(topic: str, k: int = 5):
+    """
+    Keyword search over the Wikipedia summaries loaded by wiki_dump_ingest.py.
+    Uses the GIN full-text index on knowledge_articles, so only the top k
+    rows leave the database. Returns [(title, summary), ...].
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+
+    db: Session = SessionLocal()
+    try:
+        rows = db.execute(
+            text(
+                """
+                SELECT title, summary
+                FROM knowledge_articles, plainto_tsquery('english', :topic) AS query
+                WHERE search_vector @@ query
+                ORDER BY ts_rank_cd(search_vector, query) DESC
+                LIMIT :k
+                """
+            ),
+            {"topic": topic, "k": k},
+        ).all()
+        return [(row.title, row.summary) for row in rows]
+    finally:
+        db.close()
+
+
 def get_hybrid_recommendations(failed_topic: str, context_text: str):
     """
     The Advanced RAG Pipeline: Vector + BM25 + CrossEncoder Re-ranking
@@ -47,11 +94,7 @@ def get_hybrid_recommendations(failed_topic: str, context_text: str):
 
     # --- A. DENSE RETRIEVAL (Semantic Vector Search) ---
     print("--- [RAG] Running Vector Search ---")
-    vector_store = PGVector(
-        connection_string=CONNECTION_STRING,
-        embedding_function=embeddings,
-        collection_name="knowledge_base",
-    )
+    vector_store = get_vector_store()
 
     # Get top 5 semantically similar topics
     dense_retriever = vector_store.as_retriever(search_kwargs={"k": 5})
@@ -77,6 +120,12 @@ def get_hybrid_recommendations(failed_topic: str, context_text: str):
                 {"page_content": doc_text, "metadata": metadata[idx]}
             )
 
+    # Bootstrap corpus from an offline Wikipedia dump (if one was ingested)
+    for title, summary in search_knowledge_articles(failed_topic, k=5):
+        sparse_candidates.append(
+            {"page_content": summary, "metadata": {"topic_title": title}}
+        )
+
     # Combine candidates and remove duplicates (Union)
     all_candidates = []
     seen_titles = set()
@@ -129,10 +178,6 @@ def add_to_knowledge_base(title: str, summary: str):
     Background task: Every time a quiz is generated, add its summary to the Vector DB.
     """
     print(f"--- [RAG Ingestion] Adding '{title}' to Vector DB ---")
-    vector_store = PGVector(
-        connection_string=CONNECTION_STRING,
-        embedding_function=embeddings,
-        collection_name="knowledge_base",
-    )
+    vector_store = get_vector_store()
     vector_store.add_texts(texts=[summary], metadatas=[{"topic_title": title}])
     print("--- [RAG Ingestion] Complete ---")
@@ -1,6 +1,9 @@
 import requests
 from bs4 import BeautifulSoup
 
+# Bound the fetch so a stalled Wikipedia request can't hold a generation slot forever
+SCRAPE_TIMEOUT_SECONDS = 15
+
 
 def scrape_wikipedia(url: str) -> (str, str):
     """
@@ -11,7 +14,7 @@ def scrape_wikipedia(url: str) -> (str, str):
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
         }
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=SCRAPE_TIMEOUT_SECONDS)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.content, "html.parser")
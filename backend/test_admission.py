@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from unittest.mock import Mock, patch
+
+import admission
+from admission import AdmissionController, ClientDisconnected, run_until_disconnect
+from llm_quiz_generator import GenerationCancelled
+
+
+class FakeRequest:
+    """Reports a disconnect from the given poll onwards."""
+
+    def __init__(self, disconnect_after: int):
+        self.polls = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self):
+        self.polls += 1
+        return self.polls >= self.disconnect_after
+
+
+def cancellable_worker(cancel_event):
+    """Behaves like generate_quiz_data: stops at its checkpoint once cancelled."""
+    if cancel_event.wait(5):
+        raise GenerationCancelled()
+    return {"title": "Too slow"}
+
+
+@pytest.fixture(autouse=True)
+def fast_polling():
+    with patch.object(admission, "DISCONNECT_POLL_SECONDS", 0.01):
+        yield
+
+
+# --- THE TESTS ---
+
+
+def test_slot_updates_service_time_ewma():
+    """Completed generations move the estimate 20% toward the observed time"""
+    controller = AdmissionController(max_concurrent=1, initial_service_seconds=10)
+
+    async def generate():
+        async with controller.slot():
+            assert controller.in_flight == 1
+
+    # A 5 second generation, without touching the event loop's own clock
+    clock = Mock(monotonic=Mock(side_effect=[100.0, 105.0]))
+    with patch.object(admission, "time", clock):
+        asyncio.run(generate())
+
+    assert controller.avg_service_seconds == pytest.approx(0.8 * 10 + 0.2 * 5)
+    assert controller.in_flight == 0
+
+
+def test_failed_generation_keeps_estimate():
+    """Errors and disconnects don't feed the estimate but still free the slot"""
+    controller = AdmissionController(max_concurrent=1, initial_service_seconds=10)
+
+    async def generate():
+        async with controller.slot():
+            raise ClientDisconnected()
+
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(generate())
+
+    assert controller.avg_service_seconds == 10
+    assert controller.in_flight == 0
+
+
+def test_full_queue_is_shed():
+    """A full queue gets 503 with a Retry-After derived from the estimate"""
+    controller = AdmissionController(
+        max_concurrent=2, max_queue=1, initial_service_seconds=3
+    )
+    controller.in_flight = 2
+    controller.queued = 1
+
+    async def generate():
+        async with controller.slot():
+            pass
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(generate())
+
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "3"
+
+
+def test_disconnect_while_queued_gives_up_place():
+    """A client that leaves while queued frees its queue place and takes no slot"""
+    controller = AdmissionController(max_concurrent=1, deadline_seconds=30)
+
+    async def scenario():
+        holder_done = asyncio.Event()
+
+        async def holder():
+            async with controller.slot():
+                await holder_done.wait()
+
+        holding = asyncio.create_task(holder())
+        while controller.in_flight == 0:
+            await asyncio.sleep(0)
+
+        with pytest.raises(ClientDisconnected):
+            async with controller.slot(FakeRequest(disconnect_after=2)):
+                pytest.fail("a disconnected client must not get a slot")
+        assert controller.queued == 0
+
+        # The slot is handed on normally once the holder finishes
+        holder_done.set()
+        await holding
+        async with controller.slot(FakeRequest(disconnect_after=10**6)):
+            assert controller.in_flight == 1
+
+    asyncio.run(scenario())
+    assert controller.in_flight == 0
+
+
+def test_disconnect_cancels_worker():
+    """On disconnect the worker is told to stop and ClientDisconnected is raised"""
+    cancel_event = threading.Event()
+    request = FakeRequest(disconnect_after=2)
+
+    async def generate():
+        work = asyncio.to_thread(cancellable_worker, cancel_event)
+        return await run_until_disconnect(request, work, cancel_event)
+
+    with pytest.raises(ClientDisconnected) as excinfo:
+        asyncio.run(generate())
+
+    assert cancel_event.is_set()
+    assert isinstance(excinfo.value.__cause__, GenerationCancelled)
+
+
+def test_work_finished_despite_disconnect_is_returned():
+    """A result that arrives after the disconnect is still returned for caching"""
+    cancel_event = threading.Event()
+    request = FakeRequest(disconnect_after=1)
+
+    def ignores_cancellation(event):
+        event.wait(5)
+        return {"title": "Finished anyway"}
+
+    async def generate():
+        work = asyncio.to_thread(ignores_cancellation, cancel_event)
+        return await run_until_disconnect(request, work, cancel_event)
+
+    assert asyncio.run(generate()) == {"title": "Finished anyway"}
+
+
+def test_connected_client_gets_result():
+    """Without a disconnect the worker runs to completion undisturbed"""
+    cancel_event = threading.Event()
+    request = FakeRequest(disconnect_after=10**6)
+
+    async def generate():
+        work = asyncio.to_thread(lambda: {"title": "Done"})
+        return await run_until_disconnect(request, work, cancel_event)
+
+    assert asyncio.run(generate()) == {"title": "Done"}
+    assert not cancel_event.is_set()
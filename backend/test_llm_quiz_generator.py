@@ -0,0 +1,59 @@
+import threading
+import time
+import pytest
+from langchain_core.runnables import RunnableLambda
+from unittest.mock import patch
+
+import llm_quiz_generator
+from llm_quiz_generator import GenerationCancelled, generate_quiz_data
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+
+
+def fake_llm(on_call):
+    """Patches the Gemini client with a runnable that calls on_call(prompt)."""
+    return patch.object(
+        llm_quiz_generator,
+        "ChatGoogleGenerativeAI",
+        return_value=RunnableLambda(on_call),
+    )
+
+
+# --- THE TESTS ---
+
+
+def test_cancelled_before_first_attempt():
+    """An already-cancelled request never reaches Gemini"""
+    calls = []
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    with fake_llm(calls.append):
+        with pytest.raises(GenerationCancelled):
+            generate_quiz_data("Article text", cancel_event=cancel_event)
+
+    assert calls == []
+
+
+def test_cancel_during_backoff_stops_retries():
+    """A disconnect during the 429 backoff wakes the wait early, no more attempts"""
+    calls = []
+    cancel_event = threading.Event()
+
+    def rate_limited(prompt):
+        calls.append(prompt)
+        # The client goes away while we are being rate limited
+        cancel_event.set()
+        raise Exception("429 RESOURCE_EXHAUSTED")
+
+    start = time.monotonic()
+    with fake_llm(rate_limited):
+        with pytest.raises(GenerationCancelled):
+            generate_quiz_data("Article text", cancel_event=cancel_event)
+
+    assert len(calls) == 1
+    # The first backoff is 5s; cancel_event.wait() must have returned at once
+    assert time.monotonic() - start < 1
@@ -1,11 +1,18 @@
 import pytest
 from fastapi.testclient import TestClient
-from main import app, get_db
+from main import app, get_db, get_async_db, scrape_and_generate
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, QuizHistory
-from models import UserUsage
-from unittest.mock import patch
+from sqlalchemy.pool import NullPool
+from database import Base, QuizHistory, to_async_url
+from models import TopicEdge, UserUsage
+from admission import AdmissionController
+from llm_quiz_generator import GenerationCancelled
+from datetime import datetime
+from fastapi import Request
+import threading
+from unittest.mock import AsyncMock, patch
 
 # 1. Setup a Temporary Test Database (SQLite in memory)
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -15,6 +22,13 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: TestClient may run each request on a fresh event loop
+async_url, async_connect_args = to_async_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(
+    async_url, connect_args=async_connect_args, poolclass=NullPool
+)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
 
 # 2. Override the Dependency
 def override_get_db():
@@ -25,7 +39,13 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 # 3. Create the Test Client
 client = TestClient(app)
@@ -96,6 +116,12 @@ def test_generate_quiz_success():
     Test a successful quiz generation by MOCKING the AI response.
     This verifies the DB save and Response format without calling Gemini.
     """
+    # Fresh quota: test_rate_limiting used up this IP's requests
+    db = TestingSessionLocal()
+    db.query(UserUsage).delete()
+    db.commit()
+    db.close()
+
     # 1. Fake Data to return instead of calling Google
     mock_ai_response = {
         "title": "Mock Quiz",
@@ -111,7 +137,10 @@ def test_generate_quiz_success():
         mock_scrape.return_value = ("Mock Title", "Mock Article Text")
 
         # 3. Patch 'generate_quiz_data' to return our Fake JSON
-        with patch("llm_quiz_generator.generate_quiz_data") as mock_llm:
+        # (and keep the background RAG/graph tasks away from the real stores)
+        with patch("llm_quiz_generator.generate_quiz_data") as mock_llm, patch(
+            "main.update_topic_neighbourhood"
+        ), patch("main.add_to_knowledge_base"):
             mock_llm.return_value = mock_ai_response
 
             # 4. Make the Request
@@ -122,3 +151,148 @@ def test_generate_quiz_success():
             assert response.status_code == 200
             assert response.json()["title"] == "Mock Quiz"
             assert "id" in response.json()  # Did it generate an ID?
+
+
+def test_recommend_path_uses_graph():
+    """Known topics should be answered from the prerequisite graph, no live RAG"""
+    db = TestingSessionLocal()
+    db.add_all(
+        [
+            TopicEdge(topic="Alan Turing", neighbor="Computation", weight=0.4),
+            TopicEdge(topic="Alan Turing", neighbor="Algorithm", weight=0.9),
+            TopicEdge(topic="Alan Turing", neighbor="Turing machine", weight=0.7),
+        ]
+    )
+    db.commit()
+    db.close()
+
+    with patch("main.get_hybrid_recommendations") as mock_rag:
+        payload = {"failed_topic": "Alan Turing", "summary_of_failed_topic": "50%"}
+        response = client.post("/recommend_path", json=payload)
+
+        assert response.status_code == 200
+        assert response.json()["recommended_topics"] == ["Algorithm", "Turing machine"]
+        mock_rag.assert_not_called()
+
+
+def test_recommend_path_unknown_topic_falls_back():
+    """Topics missing from the graph go through the live Hybrid RAG pipeline"""
+    with patch("main.get_hybrid_recommendations") as mock_rag:
+        mock_rag.return_value = ["Basic Principles"]
+        payload = {"failed_topic": "Brand New Topic", "summary_of_failed_topic": "0%"}
+        response = client.post("/recommend_path", json=payload)
+
+        assert response.status_code == 200
+        assert response.json()["recommended_topics"] == ["Basic Principles"]
+        mock_rag.assert_called_once()
+
+
+def test_generate_quiz_sheds_load_when_saturated():
+    """
+    With every generation slot busy, cache misses get 503 + Retry-After
+    without touching the scraper, while cache hits are still served.
+    """
+    db = TestingSessionLocal()
+    db.query(UserUsage).delete()
+    cached = QuizHistory(url="https://en.wikipedia.org/wiki/Cached", title="Cached")
+    cached.set_full_data({"title": "Cached", "summary": "Already generated."})
+    db.add(cached)
+    db.commit()
+    db.close()
+
+    # One slot, already taken, ~60s per generation -> estimated wait exceeds 30s deadline
+    saturated = AdmissionController(
+        max_concurrent=1, max_queue=4, deadline_seconds=30, initial_service_seconds=60
+    )
+    saturated.in_flight = 1
+
+    with patch("main.generation_admission", saturated), patch(
+        "scraper.scrape_wikipedia"
+    ) as mock_scrape:
+        payload = {"url": "https://en.wikipedia.org/wiki/Overloaded"}
+        response = client.post("/generate_quiz", json=payload)
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "60"
+        mock_scrape.assert_not_called()
+
+        payload = {"url": "https://en.wikipedia.org/wiki/Cached"}
+        response = client.post("/generate_quiz", json=payload)
+
+        assert response.status_code == 200
+        assert response.json()["title"] == "Cached"
+
+
+def test_shed_request_is_not_counted():
+    """A request shed with 503 must not use up the caller's hourly quota"""
+    db = TestingSessionLocal()
+    db.query(UserUsage).delete()
+    db.add(UserUsage(ip_address="testclient", count=1, window_start=datetime.utcnow()))
+    db.commit()
+    db.close()
+
+    saturated = AdmissionController(
+        max_concurrent=1, max_queue=4, deadline_seconds=30, initial_service_seconds=60
+    )
+    saturated.in_flight = 1
+
+    with patch("main.generation_admission", saturated):
+        payload = {"url": "https://en.wikipedia.org/wiki/Overloaded_Again"}
+        response = client.post("/generate_quiz", json=payload)
+        assert response.status_code == 503
+
+    db = TestingSessionLocal()
+    assert db.query(UserUsage).filter_by(ip_address="testclient").one().count == 1
+    db.close()
+
+
+def test_client_disconnect_returns_499():
+    """
+    A client that leaves mid-generation gets 499: the worker is cancelled,
+    nothing is saved, the quota is refunded and the service estimate is untouched.
+    """
+    db = TestingSessionLocal()
+    db.query(UserUsage).delete()
+    db.commit()
+    db.close()
+
+    controller = AdmissionController(initial_service_seconds=20)
+
+    def generation_cancelled_by_client(url, cancel_event):
+        if cancel_event.wait(5):
+            raise GenerationCancelled()
+        return {"title": "Should not be saved"}
+
+    with patch("main.generation_admission", controller), patch(
+        "main.scrape_and_generate", side_effect=generation_cancelled_by_client
+    ), patch("admission.DISCONNECT_POLL_SECONDS", 0.01), patch.object(
+        Request, "is_disconnected", AsyncMock(return_value=True)
+    ):
+        payload = {"url": "https://en.wikipedia.org/wiki/Walked_Away"}
+        response = client.post("/generate_quiz", json=payload)
+
+    assert response.status_code == 499
+    assert controller.avg_service_seconds == 20
+    assert controller.in_flight == 0
+
+    db = TestingSessionLocal()
+    assert db.query(QuizHistory).filter_by(url=payload["url"]).count() == 0
+    assert db.query(UserUsage).filter_by(ip_address="testclient").one().count == 0
+    db.close()
+
+
+def test_scrape_then_cancel_skips_llm():
+    """A client that left during scraping never reaches the LLM call"""
+    cancel_event = threading.Event()
+
+    def scrape_while_client_leaves(url):
+        cancel_event.set()
+        return "Walked Away", "Article text"
+
+    with patch(
+        "scraper.scrape_wikipedia", side_effect=scrape_while_client_leaves
+    ), patch("llm_quiz_generator.generate_quiz_data") as mock_llm:
+        with pytest.raises(GenerationCancelled):
+            scrape_and_generate("https://en.wikipedia.org/wiki/Walked_Away", cancel_event)
+
+    mock_llm.assert_not_called()
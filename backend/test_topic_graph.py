@@ -0,0 +1,178 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import IntegrityError
+from unittest.mock import patch
+
+import topic_graph
+from database import Base, QuizHistory
+from models import TopicEdge, TopicNode, TopicTerm
+
+# Only Lambda calculus shares a keyword ("symbols") with another summary
+SUMMARIES = {
+    "Turing machine": "An abstract machine that manipulates symbols on a tape.",
+    "Algorithm": "A finite sequence of instructions.",
+    "Computation": "Any calculation following a well defined model.",
+    "Baking": "Cooking food with dry heat.",
+    "Lambda calculus": "A formal system expressing functions over symbols.",
+}
+
+# Hand-picked embeddings: Algorithm sits closest to Turing machine,
+# Computation a bit further away, Baking is orthogonal to all of them.
+VECTORS = {
+    SUMMARIES["Turing machine"]: [1.0, 0.0, 0.0],
+    SUMMARIES["Algorithm"]: [0.9, 0.1, 0.0],
+    SUMMARIES["Computation"]: [0.6, 0.8, 0.0],
+    SUMMARIES["Baking"]: [0.0, 0.0, 1.0],
+    SUMMARIES["Lambda calculus"]: [0.95, 0.05, 0.0],
+}
+
+
+class FakeEmbeddings:
+    """Stand-in for the MiniLM model: summary -> fixed vector."""
+
+    def embed_documents(self, texts):
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text):
+        return VECTORS[text]
+
+
+@pytest.fixture
+def graph_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'graph.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with patch.object(topic_graph, "SessionLocal", Session), patch.object(
+        topic_graph, "embeddings", FakeEmbeddings()
+    ), patch.object(topic_graph, "GRAPH_K", 2):
+        yield Session
+    engine.dispose()
+
+
+def add_quiz(Session, title, related=()):
+    with Session() as db:
+        record = QuizHistory(url=f"https://en.wikipedia.org/wiki/{title}", title=title)
+        record.set_full_data(
+            {"summary": SUMMARIES[title], "related_topics": list(related)}
+        )
+        db.add(record)
+        db.commit()
+
+
+def neighbours(Session, title):
+    with Session() as db:
+        return topic_graph.get_prerequisites(db, title, n=10)
+
+
+def edge_weight(Session, topic, neighbor):
+    with Session() as db:
+        edge = (
+            db.query(TopicEdge)
+            .filter(TopicEdge.topic == topic, TopicEdge.neighbor == neighbor)
+            .one_or_none()
+        )
+        return edge.weight if edge else None
+
+
+# --- THE TESTS ---
+
+
+def test_build_keeps_k_nearest_neighbours(graph_db):
+    """Each topic keeps its GRAPH_K strongest neighbours, strongest first"""
+    for title in ["Turing machine", "Algorithm", "Computation", "Baking"]:
+        add_quiz(graph_db, title)
+
+    assert topic_graph.build_topic_graph() == 4
+
+    assert neighbours(graph_db, "Turing machine") == ["Algorithm", "Computation"]
+    assert neighbours(graph_db, "Algorithm") == ["Turing machine", "Computation"]
+    # Baking shares no direction and no links with anything
+    assert neighbours(graph_db, "Baking") == []
+    with graph_db() as db:
+        assert db.query(TopicNode).count() == 4
+        # Postings are stored per term, without stopwords
+        assert db.query(TopicTerm).filter(TopicTerm.term == "symbols").count() == 1
+        assert db.query(TopicTerm).filter(TopicTerm.term == "a").count() == 0
+
+
+def test_link_evidence_counts_in_both_directions(graph_db):
+    """A related_topics link alone yields an edge of weight LINK_WEIGHT both ways"""
+    add_quiz(graph_db, "Turing machine", related=["Baking"])
+    add_quiz(graph_db, "Baking")
+
+    topic_graph.build_topic_graph()
+
+    # Orthogonal embeddings and no shared keywords: only the link remains
+    assert edge_weight(graph_db, "Turing machine", "Baking") == pytest.approx(
+        topic_graph.LINK_WEIGHT
+    )
+    assert edge_weight(graph_db, "Baking", "Turing machine") == pytest.approx(
+        topic_graph.LINK_WEIGHT
+    )
+
+
+def test_update_replaces_weakest_reverse_edge(graph_db):
+    """A new topic displaces the weakest edge of a topic that already has GRAPH_K"""
+    for title in ["Turing machine", "Algorithm", "Computation"]:
+        add_quiz(graph_db, title)
+    topic_graph.build_topic_graph()
+    assert neighbours(graph_db, "Turing machine") == ["Algorithm", "Computation"]
+
+    topic_graph.update_topic_neighbourhood(
+        "Lambda calculus", SUMMARIES["Lambda calculus"], ["Turing machine"]
+    )
+
+    # Turing machine is full (GRAPH_K = 2): Computation is the weakest edge and
+    # loses its place to the new, closer topic
+    assert neighbours(graph_db, "Turing machine") == ["Lambda calculus", "Algorithm"]
+    assert neighbours(graph_db, "Lambda calculus")[0] == "Turing machine"
+    with graph_db() as db:
+        assert db.query(TopicEdge).filter(TopicEdge.topic == "Turing machine").count() == 2
+
+
+def test_update_matches_full_rebuild(graph_db):
+    """Incremental statistics give the same forward edges as a full rebuild"""
+    for title in ["Turing machine", "Algorithm", "Computation"]:
+        add_quiz(graph_db, title)
+    topic_graph.build_topic_graph()
+
+    topic_graph.update_topic_neighbourhood(
+        "Lambda calculus", SUMMARIES["Lambda calculus"], ["Turing machine"]
+    )
+    incremental = edge_weight(graph_db, "Lambda calculus", "Turing machine")
+
+    add_quiz(graph_db, "Lambda calculus", related=["Turing machine"])
+    topic_graph.build_topic_graph()
+    assert edge_weight(graph_db, "Lambda calculus", "Turing machine") == pytest.approx(
+        incremental
+    )
+
+
+def test_first_update_bootstraps_from_history(graph_db):
+    """With an empty graph, the first update builds it from all of QuizHistory"""
+    for title in ["Turing machine", "Algorithm", "Computation", "Lambda calculus"]:
+        add_quiz(graph_db, title)
+
+    topic_graph.update_topic_neighbourhood(
+        "Lambda calculus", SUMMARIES["Lambda calculus"], []
+    )
+
+    with graph_db() as db:
+        assert db.query(TopicNode).count() == 4
+    # Pre-deploy quizzes are neighbours too, not just the new topic
+    assert set(neighbours(graph_db, "Algorithm")) == {"Turing machine", "Lambda calculus"}
+
+
+def test_concurrent_insert_of_same_topic_is_skipped(graph_db):
+    """A primary-key clash with another worker's update is not an error"""
+    add_quiz(graph_db, "Turing machine")
+    topic_graph.build_topic_graph()
+
+    clash = IntegrityError("INSERT INTO topic_nodes", {}, Exception("duplicate key"))
+    with patch.object(topic_graph, "_insert_topic", side_effect=clash):
+        topic_graph.update_topic_neighbourhood(
+            "Algorithm", SUMMARIES["Algorithm"], []
+        )
+
+    assert neighbours(graph_db, "Turing machine") == []
@@ -0,0 +1,93 @@
+import os
+import pytest
+from wiki_dump_ingest import (
+    extract_lead_section,
+    ingest_dump,
+    iter_dump_articles,
+    load_checkpoint,
+)
+
+# Small pages-articles dump checked into the repo (no network needed)
+FIXTURE_DUMP = os.path.join(
+    os.path.dirname(__file__), "..", "sample_data", "wiki_dump_sample.xml"
+)
+
+
+def fake_embed(texts):
+    """Stand-in for the embedding model: one tiny vector per text."""
+    return [[float(len(text))] for text in texts]
+
+
+# --- THE TESTS ---
+
+
+def test_parse_fixture_dump():
+    """Redirects, talk pages and disambiguation pages should be skipped"""
+    titles = [title for title, _ in iter_dump_articles(FIXTURE_DUMP)]
+    assert titles == ["Alan Turing", "Algorithm", "Turing machine", "Computation"]
+
+
+def test_lead_section_is_plain_text():
+    """Only the lead survives, with templates, refs and link markup stripped"""
+    wikitext = (
+        "{{Infobox person|name={{nowrap|Ada}}}}\n"
+        "'''Ada Lovelace''' was an English [[mathematician]] and "
+        "[[Writer|writer]].<ref>{{cite book|title=Ada}}</ref>\n"
+        "[[File:Ada.jpg|thumb|Portrait of [[Ada Lovelace]]]]\n"
+        "== Biography ==\nShe was born in London."
+    )
+    assert (
+        extract_lead_section(wikitext)
+        == "Ada Lovelace was an English mathematician and writer."
+    )
+
+
+def test_parse_abstract_dump(tmp_path):
+    """Abstract dumps (<feed><doc>) are supported as well"""
+    dump = tmp_path / "abstract.xml"
+    dump.write_text(
+        "<feed><doc><title>Wikipedia: Graph theory</title>"
+        "<url>https://en.wikipedia.org/wiki/Graph_theory</url>"
+        "<abstract>In mathematics, graph theory is the study of graphs.</abstract>"
+        "<links /></doc></feed>"
+    )
+    assert list(iter_dump_articles(str(dump))) == [
+        ("Graph theory", "In mathematics, graph theory is the study of graphs.")
+    ]
+
+
+def test_ingest_resumes_from_checkpoint(tmp_path):
+    """A crashed run should resume after the last loaded batch"""
+    checkpoint = str(tmp_path / "ingest.checkpoint.json")
+    loaded = []
+
+    def crashing_sink(batch, vectors):
+        if loaded:
+            raise RuntimeError("simulated crash")
+        loaded.extend(title for title, _ in batch)
+
+    with pytest.raises(RuntimeError):
+        ingest_dump(
+            FIXTURE_DUMP,
+            sink=crashing_sink,
+            embed_documents=fake_embed,
+            batch_size=2,
+            checkpoint_path=checkpoint,
+        )
+    assert load_checkpoint(checkpoint, FIXTURE_DUMP) == 2
+
+    def sink(batch, vectors):
+        assert len(vectors) == len(batch)
+        loaded.extend(title for title, _ in batch)
+
+    stats = ingest_dump(
+        FIXTURE_DUMP,
+        sink=sink,
+        embed_documents=fake_embed,
+        batch_size=2,
+        checkpoint_path=checkpoint,
+    )
+    assert loaded == ["Alan Turing", "Algorithm", "Turing machine", "Computation"]
+    assert stats["articles_loaded"] == 2
+    assert stats["articles_total"] == 4
+    assert load_checkpoint(checkpoint, FIXTURE_DUMP) == 4
@@ -0,0 +1,358 @@
+"""
+Precomputed prerequisite graph over the topics in QuizHistory.
+
+Each topic keeps its GRAPH_K strongest neighbours. Edge weights combine
+dense similarity (MiniLM embeddings), BM25 keyword overlap and link
+evidence from the LLM's `related_topics`. /recommend_path reads the
+neighbours with one indexed query. Topics missing from the graph fall back
+to the live hybrid RAG pipeline.
+
+Full rebuild (offline):
+    python topic_graph.py
+
+New quizzes call update_topic_neighbourhood() as a background task. The
+BM25 statistics live in an inverted index (topic_terms) and the links in
+topic_links, so an update reads only the postings of its own terms plus the
+compact embedding column. It never re-parses QuizHistory or rebuilds BM25.
+If the graph is still empty while QuizHistory is not (a deployment that never
+ran the rebuild), the first update bootstraps it with a full build instead, so
+new topics are never compared against only the quizzes made since deploy.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, QuizHistory
+from models import TopicEdge, TopicLink, TopicNode, TopicTerm
+from rag_pipeline import embeddings
+
+# Neighbours stored per topic
+GRAPH_K = 5
+
+# How much each kind of evidence contributes to an edge weight
+DENSE_WEIGHT = 0.5
+SPARSE_WEIGHT = 0.2
+LINK_WEIGHT = 0.3
+
+# Graph writes in this process run one at a time (background tasks may overlap)
+_graph_lock = threading.Lock()
+
+# BM25 parameters (same defaults as rank_bm25's BM25Okapi)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Very common words would otherwise pull a posting for almost every topic
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has he in is it its of on or she that the "
+    "this to was were which with his her their they".split()
+)
+_TOKEN = re.compile(r"\w+")
+
+
+def _tokenize(text: str) -> Counter:
+    return Counter(t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS)
+
+
+def _load_topics(db: Session) -> dict:
+    """Maps each quiz title to (summary, lower-cased related_topics); newest wins."""
+    topics = {}
+    quizzes = (
+        db.query(QuizHistory)
+        .filter(QuizHistory.full_quiz_data.isnot(None))
+        .order_by(QuizHistory.date_generated.asc())
+        .all()
+    )
+    for q in quizzes:
+        data = q.get_full_data()
+        if data.get("summary"):
+            related = {t.lower() for t in data.get("related_topics", [])}
+            topics[q.title] = (data["summary"], related)
+    return topics
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _bm25_scores(query_terms, postings: dict, lengths: np.ndarray) -> np.ndarray:
+    """
+    BM25 of one summary against every topic. postings maps term -> {topic
+    position: tf} and only needs the query's own terms.
+    """
+    n_docs = len(lengths)
+    avgdl = lengths.mean() or 1.0
+    scores = np.zeros(n_docs, dtype=np.float32)
+    for term in query_terms:
+        docs = postings.get(term)
+        if not docs:
+            continue
+        idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+        idx = np.fromiter(docs.keys(), dtype=np.int64)
+        tf = np.fromiter(docs.values(), dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[idx] / avgdl)
+        scores[idx] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+
+def _edge_weights(position, dense, sparse, link) -> np.ndarray:
+    """Combines the three kinds of evidence; the topic itself gets weight 0."""
+    sparse = sparse.copy()
+    sparse[position] = 0  # self-match would otherwise dominate the max
+    if sparse.max() > 0:
+        sparse = sparse / sparse.max()
+    weights = (
+        DENSE_WEIGHT * np.clip(dense, 0, 1) + SPARSE_WEIGHT * sparse + LINK_WEIGHT * link
+    )
+    weights[position] = 0
+    return weights
+
+
+def _top_k_edges(title, titles, weights):
+    edges = []
+    for idx in np.argsort(weights)[::-1][:GRAPH_K]:
+        if weights[idx] <= 0:
+            break
+        edges.append(
+            {"topic": title, "neighbor": titles[idx], "weight": float(weights[idx])}
+        )
+    return edges
+
+
+def _node_rows(title, vector, counts, related):
+    node = {"title": title, "embedding": vector.tobytes(), "length": sum(counts.values())}
+    terms = [{"topic": title, "term": term, "tf": tf} for term, tf in counts.items()]
+    links = [{"topic": title, "target": target} for target in related]
+    return node, terms, links
+
+
+def build_topic_graph() -> int:
+    """
+    Rebuilds the whole graph from QuizHistory. Returns the number of topics.
+    """
+    with _graph_lock:
+        return _rebuild_graph()
+
+
+def _rebuild_graph() -> int:
+    db: Session = SessionLocal()
+    try:
+        topics = _load_topics(db)
+        titles = list(topics)
+
+        for model in (TopicEdge, TopicTerm, TopicLink, TopicNode):
+            db.query(model).delete()
+        if not titles:
+            db.commit()
+            return 0
+
+        print(f"--- [Graph] Embedding {len(titles)} topics ---")
+        summaries = [topics[t][0] for t in titles]
+        vectors = np.asarray(embeddings.embed_documents(summaries), dtype=np.float32)
+        unit_vectors = _normalize(vectors)
+
+        term_counts = [_tokenize(s) for s in summaries]
+        lengths = np.array([sum(c.values()) for c in term_counts], dtype=np.float32)
+        postings = defaultdict(dict)
+        for idx, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                postings[term][idx] = tf
+
+        # Link evidence counts in either direction
+        position_by_name = {t.lower(): idx for idx, t in enumerate(titles)}
+        linked = [set() for _ in titles]
+        for idx, title in enumerate(titles):
+            for target in topics[title][1]:
+                other = position_by_name.get(target)
+                if other is not None:
+                    linked[idx].add(other)
+                    linked[other].add(idx)
+
+        nodes, terms, links, edges = [], [], [], []
+        for idx, title in enumerate(titles):
+            link = np.zeros(len(titles), dtype=np.float32)
+            link[list(linked[idx])] = 1
+            weights = _edge_weights(
+                idx,
+                unit_vectors @ unit_vectors[idx],
+                _bm25_scores(term_counts[idx], postings, lengths),
+                link,
+            )
+            edges.extend(_top_k_edges(title, titles, weights))
+
+            node, node_terms, node_links = _node_rows(
+                title, vectors[idx], term_counts[idx], topics[title][1]
+            )
+            nodes.append(node)
+            terms.extend(node_terms)
+            links.extend(node_links)
+
+        db.bulk_insert_mappings(TopicNode, nodes)
+        db.bulk_insert_mappings(TopicTerm, terms)
+        db.bulk_insert_mappings(TopicLink, links)
+        db.bulk_insert_mappings(TopicEdge, edges)
+        db.commit()
+        print(f"--- [Graph] Stored {len(edges)} edges ---")
+        return len(titles)
+    finally:
+        db.close()
+
+
+def update_topic_neighbourhood(title: str, summary: str, related_topics: list):
+    """
+    Background task: adds one new quiz topic to the graph. Only its own edges
+    are rewritten, and it enters another topic's neighbour list only if it
+    beats that topic's weakest edge.
+    """
+    print(f"--- [Graph] Updating neighbourhood of '{title}' ---")
+    with _graph_lock:
+        db: Session = SessionLocal()
+        try:
+            bootstrap = _needs_bootstrap(db)
+            if not bootstrap:
+                _insert_topic(db, title, summary, related_topics)
+                db.commit()
+        except IntegrityError:
+            # Another worker process inserted the same topic at the same time;
+            # its rows describe the same quiz, so keep them
+            db.rollback()
+            print(f"--- [Graph] '{title}' was updated concurrently, skipping ---")
+            return
+        finally:
+            db.close()
+
+        if bootstrap:
+            # QuizHistory already holds the new quiz, so the full build covers it
+            print("--- [Graph] Graph is empty, bootstrapping from QuizHistory ---")
+            try:
+                _rebuild_graph()
+            except IntegrityError:
+                print("--- [Graph] Another worker is bootstrapping, skipping ---")
+                return
+    print("--- [Graph] Update complete ---")
+
+
+def _needs_bootstrap(db: Session) -> bool:
+    """True while the graph is empty but there are quizzes to build it from."""
+    if db.query(TopicNode.title).first() is not None:
+        return False
+    return (
+        db.query(QuizHistory.id).filter(QuizHistory.full_quiz_data.isnot(None)).first()
+        is not None
+    )
+
+
+def _insert_topic(db: Session, title: str, summary: str, related_topics: list):
+    """Incremental path of update_topic_neighbourhood; the caller commits."""
+    counts = _tokenize(summary)
+    related = {t.lower() for t in related_topics}
+    vector = np.asarray(embeddings.embed_query(summary), dtype=np.float32)
+
+    # 1. Replace whatever this topic had before (same title quizzed again)
+    for model, column in (
+        (TopicEdge, TopicEdge.topic),
+        (TopicEdge, TopicEdge.neighbor),
+        (TopicTerm, TopicTerm.topic),
+        (TopicLink, TopicLink.topic),
+        (TopicNode, TopicNode.title),
+    ):
+        db.query(model).filter(column == title).delete(synchronize_session=False)
+
+    node, terms, links = _node_rows(title, vector, counts, related)
+    db.bulk_insert_mappings(TopicNode, [node])
+    db.bulk_insert_mappings(TopicTerm, terms)
+    db.bulk_insert_mappings(TopicLink, links)
+
+    # 2. Dense evidence: the one pass over all nodes, on compact float32 blobs
+    rows = db.query(TopicNode.title, TopicNode.embedding, TopicNode.length).all()
+    titles = [row.title for row in rows]
+    position = {t: idx for idx, t in enumerate(titles)}
+    me = position[title]
+    unit_vectors = _normalize(
+        np.stack([np.frombuffer(row.embedding, dtype=np.float32) for row in rows])
+    )
+    lengths = np.array([row.length or 0 for row in rows], dtype=np.float32)
+
+    # 3. Sparse evidence: only the postings of this summary's terms
+    postings = defaultdict(dict)
+    if counts:
+        for topic, term, tf in db.query(
+            TopicTerm.topic, TopicTerm.term, TopicTerm.tf
+        ).filter(TopicTerm.term.in_(list(counts))):
+            if topic in position:
+                postings[term][position[topic]] = tf
+
+    # 4. Link evidence in either direction
+    link = np.zeros(len(titles), dtype=np.float32)
+    position_by_name = {t.lower(): idx for idx, t in enumerate(titles)}
+    for target in related:
+        if target in position_by_name:
+            link[position_by_name[target]] = 1
+    for (topic,) in db.query(TopicLink.topic).filter(
+        TopicLink.target == title.lower()
+    ):
+        if topic in position:
+            link[position[topic]] = 1
+
+    weights = _edge_weights(
+        me,
+        unit_vectors @ unit_vectors[me],
+        _bm25_scores(counts, postings, lengths),
+        link,
+    )
+    db.bulk_insert_mappings(TopicEdge, _top_k_edges(title, titles, weights))
+
+    # 5. Insert reverse edges where the new topic makes another topic's top-k
+    # (BM25 is asymmetric; the forward score is reused as an approximation)
+    edge_stats = {
+        topic: (count, min_weight)
+        for topic, count, min_weight in db.query(
+            TopicEdge.topic, func.count(TopicEdge.id), func.min(TopicEdge.weight)
+        )
+        .group_by(TopicEdge.topic)
+        .all()
+    }
+    for idx in np.nonzero(weights > 0)[0]:
+        other, weight = titles[idx], float(weights[idx])
+        count, min_weight = edge_stats.get(other, (0, 0.0))
+        if count >= GRAPH_K:
+            if weight <= min_weight:
+                continue
+            weakest = (
+                db.query(TopicEdge)
+                .filter(TopicEdge.topic == other)
+                .order_by(TopicEdge.weight.asc())
+                .first()
+            )
+            db.delete(weakest)
+        db.add(TopicEdge(topic=other, neighbor=title, weight=weight))
+
+
+def get_prerequisites(db: Session, title: str, n: int = 2) -> list:
+    """
+    Direct lookup of the strongest neighbours of a known topic.
+    Returns an empty list when the topic is not in the graph yet.
+    """
+    rows = (
+        db.query(TopicEdge.neighbor)
+        .filter(TopicEdge.topic == title)
+        .order_by(TopicEdge.weight.desc())
+        .limit(n)
+        .all()
+    )
+    return [row.neighbor for row in rows]
+
+
+if __name__ == "__main__":
+    import database
+
+    database.Base.metadata.create_all(bind=database.engine)
+    count = build_topic_graph()
+    print(f"--- [Graph] Built prerequisite graph for {count} topics ---")
@@ -0,0 +1,396 @@
+"""
+Offline knowledge-base bootstrap from a local Wikipedia dump.
+
+Stream-parses a pages-articles XML dump (or an abstract dump) with iterparse,
+extracts the lead section of each article, embeds the summaries in batches
+across a process pool and bulk-loads them into PGVector + the
+knowledge_articles table. A checkpoint file is written after every loaded
+batch so an interrupted run resumes where it stopped. Keyword search over
+the loaded articles goes through a Postgres full-text (GIN) index, which
+Postgres maintains as rows are inserted.
+
+Usage:
+    python wiki_dump_ingest.py enwiki-latest-pages-articles.xml.bz2 --workers 4
+    python wiki_dump_ingest.py ../sample_data/wiki_dump_sample.xml --workers 0
+"""
+
+import argparse
+import bz2
+import gzip
+import html
+import itertools
+import json
+import os
+import re
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+
+MAX_SUMMARY_CHARS = 600
+MIN_SUMMARY_CHARS = 40
+
+# --- WIKITEXT CLEANUP PATTERNS ---
+_HEADING = re.compile(r"^=+[^=\n].*?=+\s*$", re.MULTILINE)
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+_TABLE = re.compile(r"\{\|.*?\|\}", re.DOTALL)
+_FILE_LINK = re.compile(
+    r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]",
+    re.IGNORECASE,
+)
+_WIKI_LINK = re.compile(r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]")
+_EXT_LINK = re.compile(r"\[https?://[^\s\]]+\s*([^\]]*)\]")
+_BOLD_ITALIC = re.compile(r"'{2,}")
+_HTML_TAG = re.compile(r"<[^>]+>")
+_EMPTY_PARENS = re.compile(r"\(\s*[,;]?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _local(tag: str) -> str:
+    """Strips the XML namespace: '{http://...}page' -> 'page'."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _open_dump(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _truncate(text: str) -> str:
+    """Keeps whole sentences up to MAX_SUMMARY_CHARS."""
+    if len(text) <= MAX_SUMMARY_CHARS:
+        return text
+    summary = ""
+    for sentence in _SENTENCE_END.split(text):
+        if summary and len(summary) + len(sentence) + 1 > MAX_SUMMARY_CHARS:
+            break
+        summary = f"{summary} {sentence}".strip()
+    return summary[:MAX_SUMMARY_CHARS]
+
+
+def extract_lead_section(wikitext: str) -> str:
+    """
+    Returns a plain-text summary of the lead section (everything before the
+    first heading) with templates, refs, tables and markup removed.
+    """
+    lead = _HEADING.split(wikitext, maxsplit=1)[0]
+    lead = _COMMENT.sub("", lead)
+    lead = _REF.sub("", lead)
+
+    # Templates nest ({{Infobox ... {{birth date|...}} }}), so peel innermost first
+    previous = None
+    while previous != lead:
+        previous = lead
+        lead = _TEMPLATE.sub("", lead)
+
+    lead = _TABLE.sub("", lead)
+    lead = _FILE_LINK.sub("", lead)
+    lead = _WIKI_LINK.sub(r"\1", lead)
+    lead = _EXT_LINK.sub(r"\1", lead)
+    lead = _BOLD_ITALIC.sub("", lead)
+    lead = _HTML_TAG.sub("", lead)
+    lead = html.unescape(lead)
+    lead = _EMPTY_PARENS.sub("", lead)
+    lead = _WHITESPACE.sub(" ", lead).strip()
+    lead = lead.replace(" ,", ",").replace(" .", ".")
+    return _truncate(lead)
+
+
+def _is_usable(summary: str) -> bool:
+    return len(summary) >= MIN_SUMMARY_CHARS and "may refer to" not in summary
+
+
+def _parse_page(elem):
+    """Returns (title, summary) for a main-namespace <page>, else None."""
+    title = ns = text = None
+    for child in elem.iter():
+        name = _local(child.tag)
+        if name == "title":
+            title = child.text
+        elif name == "ns":
+            ns = child.text
+        elif name == "redirect":
+            return None
+        elif name == "text":
+            text = child.text
+    if ns not in (None, "0") or not title or not text:
+        return None
+    summary = extract_lead_section(text)
+    return (title, summary) if _is_usable(summary) else None
+
+
+def _parse_abstract_doc(elem):
+    """Returns (title, summary) for an abstract-dump <doc>, else None."""
+    title = summary = None
+    for child in elem:
+        name = _local(child.tag)
+        if name == "title":
+            title = (child.text or "").removeprefix("Wikipedia: ").strip()
+        elif name == "abstract":
+            summary = _truncate(_WHITESPACE.sub(" ", child.text or "").strip())
+    if not title or not summary or not _is_usable(summary):
+        return None
+    return title, summary
+
+
+def iter_dump_articles(path: str):
+    """
+    Yields (title, summary) pairs from a Wikipedia XML dump in constant memory.
+    Handles both pages-articles dumps (<page>) and abstract dumps (<doc>).
+    """
+    with _open_dump(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        root = None
+        for event, elem in context:
+            if root is None:
+                root = elem
+                continue
+            if event != "end":
+                continue
+
+            name = _local(elem.tag)
+            if name == "page":
+                article = _parse_page(elem)
+            elif name == "doc":
+                article = _parse_abstract_doc(elem)
+            else:
+                continue
+
+            # Drop everything parsed so far; the tree never grows past one page
+            root.clear()
+            if article:
+                yield article
+
+
+# --- CHECKPOINTS ---
+
+
+def load_checkpoint(checkpoint_path: str, dump_path: str) -> int:
+    """Returns how many articles of this dump were already loaded."""
+    if not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("dump") != os.path.abspath(dump_path):
+        return 0
+    return checkpoint.get("articles_done", 0)
+
+
+def save_checkpoint(checkpoint_path: str, dump_path: str, articles_done: int):
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {
+                "dump": os.path.abspath(dump_path),
+                "articles_done": articles_done,
+                "updated": datetime.utcnow().isoformat(),
+            },
+            f,
+        )
+    os.replace(tmp_path, checkpoint_path)
+
+
+# --- EMBEDDING WORKERS ---
+
+_worker_embeddings = None
+
+
+def _init_worker(model_name: str, threads: int):
+    # Split the cores between workers instead of every worker grabbing all of them
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    global _worker_embeddings
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    _worker_embeddings = HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _embed_in_worker(texts):
+    return _worker_embeddings.embed_documents(texts)
+
+
+# --- DEFAULT SINK (Postgres + PGVector) ---
+
+
+def load_batch(articles, vectors, source: str):
+    """Bulk-loads one embedded batch into knowledge_articles and PGVector."""
+    from database import SessionLocal
+    from models import KnowledgeArticle
+    from rag_pipeline import get_vector_store
+
+    titles = [title for title, _ in articles]
+    summaries = [summary for _, summary in articles]
+
+    db = SessionLocal()
+    try:
+        # Replace instead of insert so a batch replayed after a crash stays unique
+        db.query(KnowledgeArticle).filter(KnowledgeArticle.title.in_(titles)).delete(
+            synchronize_session=False
+        )
+        db.bulk_insert_mappings(
+            KnowledgeArticle,
+            [
+                {"title": title, "summary": summary, "source": source}
+                for title, summary in articles
+            ],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    # PGVector stores ids as a plain custom_id column (no unique constraint or
+    # upsert), so delete this batch's ids first; a batch replayed after a crash
+    # then replaces its vectors instead of duplicating them.
+    ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, title)) for title in titles]
+    vector_store = get_vector_store()
+    vector_store.delete(ids=ids, collection_only=True)
+    vector_store.add_embeddings(
+        texts=summaries,
+        embeddings=vectors,
+        metadatas=[{"topic_title": title, "source": source} for title in titles],
+        ids=ids,
+    )
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_dump(
+    dump_path: str,
+    sink,
+    embed_documents=None,
+    model_name: str = None,
+    workers: int = 0,
+    batch_size: int = 256,
+    checkpoint_path: str = None,
+    limit: int = None,
+):
+    """
+    Streams the dump through embed -> sink, checkpointing after every batch.
+
+    sink(articles, vectors) receives each batch in dump order. With workers=0,
+    embed_documents(texts) runs in-process; otherwise model_name is loaded in
+    each worker of a process pool. Returns ingestion stats.
+    """
+    checkpoint_path = checkpoint_path or f"{dump_path}.checkpoint.json"
+    already_done = load_checkpoint(checkpoint_path, dump_path)
+    if already_done:
+        print(f"--- [Ingest] Resuming after {already_done} articles ---")
+
+    # Re-parsing the skipped prefix is cheap; re-embedding it is not
+    stop = None if limit is None else already_done + limit
+    remaining = itertools.islice(iter_dump_articles(dump_path), already_done, stop)
+    batches = _batched(remaining, batch_size)
+
+    done = already_done
+    loaded = 0
+    start = time.perf_counter()
+
+    def commit(batch, vectors):
+        nonlocal done, loaded
+        sink(batch, vectors)
+        done += len(batch)
+        loaded += len(batch)
+        save_checkpoint(checkpoint_path, dump_path, done)
+        elapsed = time.perf_counter() - start
+        print(
+            f"--- [Ingest] {done} articles loaded "
+            f"({loaded / elapsed:.1f} articles/s) ---"
+        )
+
+    if workers <= 0:
+        for batch in batches:
+            commit(batch, embed_documents([summary for _, summary in batch]))
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            # spawn: forking a process that already holds torch threads can deadlock
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, threads),
+        ) as pool:
+            # Bounded window of in-flight batches keeps memory flat on huge dumps
+            in_flight = deque()
+            for batch in batches:
+                texts = [summary for _, summary in batch]
+                in_flight.append((batch, pool.submit(_embed_in_worker, texts)))
+                if len(in_flight) >= workers * 2:
+                    batch, future = in_flight.popleft()
+                    commit(batch, future.result())
+            while in_flight:
+                batch, future = in_flight.popleft()
+                commit(batch, future.result())
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "articles_loaded": loaded,
+        "articles_total": done,
+        "seconds": round(elapsed, 2),
+        "articles_per_second": round(loaded / elapsed, 1) if elapsed else 0.0,
+    }
+    print(f"--- [Ingest] Complete: {stats} ---")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("dump", help="Path to a local .xml / .xml.bz2 / .xml.gz dump")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--checkpoint", help="Default: <dump>.checkpoint.json")
+    parser.add_argument("--limit", type=int, help="Stop after N new articles")
+    parser.add_argument(
+        "--allow-download",
+        action="store_true",
+        help="Let HuggingFace fetch the embedding model if it is not cached",
+    )
+    args = parser.parse_args()
+
+    if not args.allow_download:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    import database
+    import models
+    import rag_pipeline
+    from sqlalchemy import text
+
+    database.Base.metadata.create_all(bind=database.engine)
+    if database.engine.dialect.name == "postgresql":
+        # create_all skips existing tables, so make sure the search index exists too
+        with database.engine.begin() as conn:
+            for statement in models.KNOWLEDGE_ARTICLE_SEARCH_DDL:
+                conn.execute(text(statement))
+    source = os.path.basename(args.dump)
+
+    ingest_dump(
+        args.dump,
+        sink=lambda batch, vectors: load_batch(batch, vectors, source),
+        embed_documents=rag_pipeline.embeddings.embed_documents,
+        model_name=rag_pipeline.EMBEDDING_MODEL,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        limit=args.limit,
+    )
+
+
+if __name__ == "__main__":
+    main()